@@ -3,6 +3,7 @@ import json
 import streamlit as st
 from google import genai
 from dotenv import load_dotenv
+from src.snippets import CHARS_PER_TOKEN, estimate_tokens, snippet_from_rag_context, truncate_words
 
 # --- CONFIGURACIÓN DE MODELO ---
 # Usamos Gemma 3 27B como pediste.
@@ -14,12 +15,31 @@ load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
 client = None
 
+# --- PRESUPUESTO DEL PROMPT RAG ---
+# Tokens aproximados para productos + historial. Así la latencia y el coste de la
+# generación no crecen con el número de candidatos ni con la longitud del chat.
+PRESUPUESTO_TOKENS_RAG = int(os.getenv("RAG_TOKEN_BUDGET", "800"))
+# Parte del presupuesto reservada al historial (los productos tienen prioridad)
+RESERVA_HISTORIAL = 0.25
+# Tope por mensaje del historial: una respuesta larga no desplaza a los turnos anteriores
+MAX_TOKENS_MENSAJE = 80
+# Por debajo de esto no vale la pena incluir un mensaje recortado
+MIN_TOKENS_MENSAJE = 8
+
 if api_key:
     try:
         client = genai.Client(api_key=api_key)
     except Exception as e:
         st.error(f"Error conexión AI: {e}")
 
+def configurar_cliente(nuevo_cliente):
+    """
+    Reemplaza el cliente de GenAI (ej. un cliente simulado para pruebas de carga offline).
+    Debe exponer client.models.generate_content(model=..., contents=...) -> objeto con .text
+    """
+    global client
+    client = nuevo_cliente
+
 def extraer_filtros_con_ia(consulta_usuario):
     """
     Extrae producto, color, categoría y marca usando Gemma 3.
@@ -68,22 +88,64 @@ def extraer_filtros_con_ia(consulta_usuario):
     except:
         return {}
 
-def generar_respuesta_rag(consulta_usuario, productos, historial):
+def _snippet_producto(producto):
+    """Snippet precalculado en la indexación; si el índice es antiguo, se deriva del rag_context."""
+    meta = producto.get('metadata', {})
+    if meta.get('rag_snippet'):
+        return meta['rag_snippet'], int(meta.get('rag_tokens') or estimate_tokens(meta['rag_snippet']))
+    return snippet_from_rag_context(
+        meta.get('title', 'Producto'), meta.get('brand', ''),
+        meta.get('category', ''), meta.get('rag_context', '')
+    )
+
+def empaquetar_contexto(consulta_usuario, productos, historial, presupuesto=PRESUPUESTO_TOKENS_RAG):
+    """
+    Llena el presupuesto de tokens en orden de relevancia:
+    primero productos (el más relevante siempre entra), luego los mensajes más recientes,
+    cada uno con un tope de tokens; el que ya no cabe se recorta al presupuesto restante.
+    """
+    presupuesto_prods = presupuesto - int(presupuesto * RESERVA_HISTORIAL)
+    usados = 0
+
+    lineas_prods = []
+    for p in productos:
+        snippet, tokens = _snippet_producto(p)
+        # Incluimos el score para que la IA sepa cuál es más relevante
+        linea = f"- (Relevancia: {p.get('score', 0):.2f}) {snippet}"
+        coste = tokens + estimate_tokens(linea) - estimate_tokens(snippet)
+        if lineas_prods and usados + coste > presupuesto_prods:
+            break
+        lineas_prods.append(linea)
+        usados += coste
+
+    # El último mensaje suele ser la propia pregunta, que ya va aparte en el prompt
+    mensajes = list(historial)
+    if mensajes and mensajes[-1].get('role') == 'user' and mensajes[-1].get('content') == consulta_usuario:
+        mensajes = mensajes[:-1]
+
+    lineas_chat = []
+    for m in reversed(mensajes):
+        linea = truncate_words(f"{m['role'].upper()}: {m['content']}", MAX_TOKENS_MENSAJE * CHARS_PER_TOKEN - 4)
+        coste = estimate_tokens(linea)
+        restante = presupuesto - usados
+        if coste > restante:
+            # El mensaje que desborda (ej. una respuesta larga) entra recortado; los anteriores no
+            if restante >= MIN_TOKENS_MENSAJE:
+                lineas_chat.insert(0, truncate_words(linea, restante * CHARS_PER_TOKEN - 4))
+            break
+        lineas_chat.insert(0, linea)
+        usados += coste
+
+    return "\n".join(lineas_prods), "\n".join(lineas_chat)
+
+def generar_respuesta_rag(consulta_usuario, productos, historial, presupuesto=PRESUPUESTO_TOKENS_RAG):
     if not client: return "Error: No hay conexión con la IA."
     
     if not productos:
         return "Lo siento, no encontré productos que coincidan exactamente. Intenta con términos más generales."
 
-    # Contexto enriquecedor
-    contexto_prods = ""
-    for p in productos:
-        meta = p.get('metadata', {})
-        rag_info = meta.get('rag_context', 'Sin descripción.')
-        # Incluimos el score para que la IA sepa cuál es más relevante
-        contexto_prods += f"- {meta.get('title', 'Producto')} (Relevancia: {p.get('score', 0):.2f}): {rag_info}\n"
-    
-    # Historial corto
-    contexto_chat = "\n".join([f"{m['role'].upper()}: {m['content']}" for m in historial[-3:]])
+    # Contexto compacto dentro del presupuesto de tokens
+    contexto_prods, contexto_chat = empaquetar_contexto(consulta_usuario, productos, historial, presupuesto)
 
     prompt = f"""
     Eres un asistente de ventas experto.
@@ -0,0 +1,99 @@
+import time
+from src.ai_logic import extraer_filtros_con_ia, generar_respuesta_rag
+
+# --- CONFIGURACIÓN DE FILTRADO ---
+# Umbrales de similitud CLIP: imagen-imagen da scores mucho más altos que texto-imagen
+UMBRAL_TEXTO = 0.15
+UMBRAL_IMAGEN = 0.60
+# Filtro de Líder Solitario: si el primero supera al segundo por más de esto, solo mostramos el primero
+MARGEN_LIDER = 0.10
+
+def analizar_consulta(prompt, filtros, imagen_path=None):
+    """
+    Paso 1 del turno: extrae filtros con IA, actualiza la memoria (in place)
+    y decide la query y el umbral para el backend.
+    """
+    nuevos_filtros = extraer_filtros_con_ia(prompt)
+
+    # TRUCO DE MEMORIA: Solo actualizamos lo que sea nuevo, conservando lo viejo (ej. el producto "speaker")
+    if nuevos_filtros:
+        filtros.update(nuevos_filtros)
+
+    # Juntamos: Producto + Marca + Color + Categoria
+    palabras_clave = [
+        filtros.get("producto"), # Esto es lo más importante (ej. "speaker")
+        filtros.get("marca"),
+        filtros.get("color"),
+        filtros.get("categoria")
+    ]
+    # Filtramos nulos y creamos el string de búsqueda
+    query_limpia = " ".join([str(p) for p in palabras_clave if p])
+
+    # Si la memoria está vacía (primer turno y falló extracción), usamos el prompt original
+    if not query_limpia:
+        query_limpia = prompt
+
+    if imagen_path:
+        return {"query": imagen_path, "tipo_busqueda": "Imagen", "umbral": UMBRAL_IMAGEN}
+    return {"query": query_limpia, "tipo_busqueda": "Texto Inteligente", "umbral": UMBRAL_TEXTO}
+
+def buscar_productos(engine, query, umbral):
+    """
+    Paso 2 del turno: búsqueda + filtros de relevancia. Retorna (resultados, score_top);
+    score_top es la similitud CLIP, o el BM25 si la búsqueda fue solo léxica.
+    """
+    resultados_crudos = engine.search(query=query)
+    if not resultados_crudos:
+        return [], None
+
+    # Búsqueda por identificador (solo BM25): el motor ya dejó únicamente productos que contienen
+    # el identificador y su score no es similitud CLIP, así que no aplican umbral ni líder solitario.
+    if resultados_crudos[0].get('retrieval') == 'lexical':
+        return resultados_crudos, resultados_crudos[0]['lexical_score']
+
+    top_score = resultados_crudos[0].get('score', 0)
+
+    # Filtro individual
+    resultados = [p for p in resultados_crudos if p.get('score', 0) >= umbral]
+
+    # Filtro de Líder Solitario
+    if len(resultados) >= 2:
+        diff = resultados[0]['score'] - resultados[1]['score']
+        if diff > MARGEN_LIDER:
+            resultados = [resultados[0]]
+
+    return resultados, top_score
+
+def procesar_turno(engine, prompt, mensajes, filtros, imagen_path=None):
+    """
+    Turno completo del chat sin UI (mismo camino que app.py): analiza, busca y genera.
+    Actualiza 'mensajes' y 'filtros' in place y retorna los resultados con tiempos por etapa (segundos).
+    """
+    tiempos = {}
+    mensajes.append({"role": "user", "content": prompt})
+
+    inicio = time.perf_counter()
+    consulta = analizar_consulta(prompt, filtros, imagen_path)
+    tiempos["filtros"] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    error = None
+    try:
+        resultados, top_score = buscar_productos(engine, consulta["query"], consulta["umbral"])
+    except Exception as e:
+        resultados, top_score, error = [], None, str(e)
+    tiempos["busqueda"] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    respuesta = generar_respuesta_rag(prompt, resultados, mensajes)
+    tiempos["respuesta"] = time.perf_counter() - inicio
+    mensajes.append({"role": "assistant", "content": respuesta})
+
+    return {
+        **consulta,
+        "resultados": resultados,
+        "top_score": top_score,
+        "respuesta": respuesta,
+        "error": error,
+        "tiempos": tiempos,
+    }
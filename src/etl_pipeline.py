@@ -3,6 +3,7 @@ import requests
 import os
 from PIL import Image
 from io import BytesIO
+from src.snippets import build_rag_snippet
 
 # --- CONFIGURACIÓN ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -143,6 +144,12 @@ def run_etl():
                 f"Reviews Summary: {reviews_str}"
             )
 
+            # --- SNIPPET COMPACTO PARA EL PROMPT ---
+            # Precalculado aquí para que el prompt builder solo tenga que sumar tokens.
+            # Usamos las mismas reseñas que rag_context para que el snippet coincida con el
+            # que se deriva de rag_context en índices antiguos (snippet_from_rag_context).
+            rag_snippet, rag_tokens = build_rag_snippet(clean_text(row['name']), brand, cat, top_reviews)
+
             relative_path = os.path.join("data", "images", f"{row['clean_id']}.jpg")
             
             valid_products.append({
@@ -152,6 +159,8 @@ def run_etl():
                 "brand": brand,
                 "description": desc_text,
                 "rag_context": rag_context, # Ahora contiene hasta 3 opiniones
+                "rag_snippet": rag_snippet,
+                "rag_tokens": rag_tokens,
                 "image_path": relative_path
             })
             
@@ -0,0 +1,92 @@
+import gzip
+import json
+import math
+import re
+from collections import Counter
+
+# --- CONFIGURACIÓN BM25 ---
+# Valores estándar de Okapi BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Conservamos letras y dígitos juntos para no romper identificadores ("4k", "b00zv9rdkk")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    """Minúsculas + secuencias alfanuméricas. Sin stemming: priorizamos coincidencias exactas."""
+    if not text: return []
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+class LexicalIndex:
+    """
+    Índice invertido BM25 en memoria sobre title/brand/description.
+    En disco se guarda como JSON comprimido con gzip:
+    postings planos [doc, tf, doc, tf, ...] por término + longitudes de documento.
+    """
+
+    def __init__(self, ids, doc_lengths, postings, k1=BM25_K1, b=BM25_B):
+        self.ids = ids
+        self.doc_lengths = doc_lengths
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self.avg_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+        self.id_to_idx = {doc_id: i for i, doc_id in enumerate(ids)}
+
+        # IDF precalculado (variante de Lucene, siempre positiva). df = len(postings) / 2
+        n_docs = len(ids)
+        self.idf = {}
+        for term, posting in postings.items():
+            df = len(posting) // 2
+            self.idf[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+    @classmethod
+    def build(cls, documents):
+        """documents: lista de (id, texto)."""
+        ids, doc_lengths, postings = [], [], {}
+        for doc_idx, (doc_id, text) in enumerate(documents):
+            terms = tokenize(text)
+            ids.append(str(doc_id))
+            doc_lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                postings.setdefault(term, []).extend([doc_idx, tf])
+        return cls(ids, doc_lengths, postings)
+
+    def save(self, path):
+        payload = {
+            "k1": self.k1,
+            "b": self.b,
+            "ids": self.ids,
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings,
+        }
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            payload = json.load(f)
+        return cls(payload["ids"], payload["doc_lengths"], payload["postings"],
+                   k1=payload.get("k1", BM25_K1), b=payload.get("b", BM25_B))
+
+    def contains_all(self, doc_id, terms):
+        """True si el documento contiene todos los términos (ya tokenizados)."""
+        doc_idx = self.id_to_idx.get(doc_id)
+        if doc_idx is None: return False
+        return all(doc_idx in self.postings.get(term, [])[0::2] for term in terms)
+
+    def search(self, query, top_k=20):
+        """Retorna lista de (id, score_bm25) ordenada de mayor a menor."""
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting: continue
+            idf = self.idf[term]
+            for i in range(0, len(posting), 2):
+                doc_idx, tf = posting[i], posting[i + 1]
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_idx] / self.avg_length)
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+        return [(self.ids[doc_idx], score) for doc_idx, score in ranked]
@@ -0,0 +1,330 @@
+"""
+Banco de pruebas de carga offline y determinista del chat.
+
+Reproduce conversaciones guionizadas (texto e imágenes de data/test_samples) por el mismo
+camino que app.py (src.conversation.procesar_turno), sustituyendo Gemini por un cliente
+simulado con latencia configurable y CLIP / Cross-Encoder por codificadores locales mínimos.
+No necesita red ni modelos descargados.
+
+Uso:
+    python -m src.loadtest --concurrency 4 --repeat 5 --llm-latency 0.3
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import chromadb
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from src import ai_logic
+from src.conversation import procesar_turno
+from src.lexical_index import tokenize
+from src.processing import build_product_metadata
+from src.retrieval import SearchEngine
+
+# --- CONFIGURACIÓN ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+CSV_PATH = os.path.join(PROJECT_ROOT, "data", "processed_products.csv")
+TEST_SAMPLES_DIR = os.path.join(PROJECT_ROOT, "data", "test_samples")
+
+# Misma dimensión que CLIP ViT-B-32: mitad texto (hashing), mitad imagen (histograma de color)
+STANDIN_DIM = 512
+# Peso de cada mitad en el vector del producto. Con más peso en la imagen, las búsquedas
+# imagen-imagen alcanzan el umbral de app.py (0.60) como lo haría CLIP.
+TEXT_WEIGHT = 0.5
+IMAGE_WEIGHT = 0.866
+
+PERCENTILES = [50, 90, 95, 99]
+
+# Conversaciones por defecto. "imagen" es relativa a data/test_samples y "filtros" es lo que
+# devolverá el LLM simulado en la extracción de ese turno (si falta, {}: no cambia la memoria).
+DEFAULT_CONVERSATIONS = [
+    [
+        {"texto": "Quiero un Fire TV Stick 4K", "filtros": {"producto": "Fire TV Stick 4K"}},
+        {"texto": "¿Tiene control por voz con Alexa?", "filtros": {}},
+        {"texto": "Busca algo parecido a esto", "imagen": "amazon-fire-tv-stick-4k-2nd-gen.jpg"},
+    ],
+    [
+        {"texto": "Necesito pilas AA", "filtros": {"producto": "AA batteries"}},
+        {"texto": "¿Cuánto duran según las reseñas?", "filtros": {}},
+        {"texto": "Estas son las que uso", "imagen": "pilas-doble-aa-duracell-blister-28-piezas-D_NQ_NP_124725-MLM25490102980_042017-F.jpg"},
+    ],
+    [
+        {"texto": "Quiero un teclado bluetooth", "filtros": {"producto": "bluetooth keyboard"}},
+        {"texto": "Que sea negro", "filtros": {"color": "black"}},
+        {"texto": "Algo así", "imagen": "keyboard-5809811_1280.jpg"},
+    ],
+    [
+        {"texto": "¿Qué es esto?", "imagen": "que_es_alexa_y_como_funciona_53622_orig.jpg"},
+        {"texto": "Muéstrame el echo dot", "filtros": {"producto": "Echo Dot", "marca": "Amazon"}},
+        {"texto": "¿Y este otro?", "imagen": "alexa-o-que-ou-quem-e-como-funciona-essa-tecnologia-6-960x540.jpg"},
+    ],
+]
+
+# --- SUSTITUTOS LOCALES ---
+
+def _stable_hash(text):
+    """Hash estable entre procesos (hash() de Python cambia con PYTHONHASHSEED)."""
+    return int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:8], "little")
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class _FakeModels:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def generate_content(self, model, contents):
+        return self._owner._generate(model, contents)
+
+class FakeGenAIClient:
+    """
+    Sustituto de google.genai.Client: misma interfaz (client.models.generate_content),
+    respuestas deterministas y latencia simulada = latency ± jitter (derivado del prompt).
+    La extracción de filtros devuelve lo fijado con set_filtros() para el turno en curso.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.models = _FakeModels(self)
+        self._lock = threading.Lock()
+        # Guion por hilo: cada sesión concurrente corre en su propio hilo
+        self._local = threading.local()
+        self.calls = 0
+        self.prompt_chars = []
+
+    def set_filtros(self, filtros):
+        """Filtros que devolverá la extracción en este hilo (guion del turno actual)."""
+        self._local.filtros = filtros
+
+    def _generate(self, model, contents):
+        with self._lock:
+            self.calls += 1
+            self.prompt_chars.append(len(contents))
+
+        # Jitter reproducible: depende solo del contenido del prompt
+        offset = (_stable_hash(contents) % 2001 - 1000) / 1000 * self.jitter
+        time.sleep(max(0.0, self.latency + offset))
+
+        if "convierte lenguaje natural a JSON" in contents:
+            # Extracción de filtros: guion del turno o nada nuevo (la memoria se conserva)
+            filtros = getattr(self._local, "filtros", None) or {}
+            return _FakeResponse(json.dumps(filtros, ensure_ascii=False))
+        return _FakeResponse(f"Respuesta simulada ({model}) para un prompt de {len(contents)} caracteres.")
+
+class StandInEncoder:
+    """
+    Sustituto de CLIP con encode(texto | PIL.Image) -> vector unitario de STANDIN_DIM.
+    Texto: bolsa de palabras con hashing. Imagen: histograma de color RGB (8x8x4).
+    """
+    half = STANDIN_DIM // 2
+
+    def _encode_text(self, text):
+        vec = np.zeros(self.half, dtype=np.float32)
+        for term in tokenize(text):
+            vec[_stable_hash(term) % self.half] += 1.0
+        return vec
+
+    def _encode_image(self, image):
+        pixels = np.asarray(image.convert("RGB").resize((64, 64)), dtype=np.uint8).reshape(-1, 3)
+        bins = (pixels[:, 0] // 32) * 32 + (pixels[:, 1] // 32) * 4 + pixels[:, 2] // 64
+        # Raíz cuadrada (Hellinger) para que el fondo blanco no domine la similitud
+        return np.sqrt(np.bincount(bins, minlength=self.half).astype(np.float32))
+
+    @staticmethod
+    def _normalize(vec):
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def encode(self, item):
+        vec = np.zeros(STANDIN_DIM, dtype=np.float32)
+        if isinstance(item, Image.Image):
+            vec[self.half:] = self._normalize(self._encode_image(item))
+        else:
+            vec[:self.half] = self._normalize(self._encode_text(item))
+        return vec
+
+    def encode_product(self, text, image):
+        """Vector de indexación: ambas mitades, para que texto e imagen encuentren el producto."""
+        vec = np.zeros(STANDIN_DIM, dtype=np.float32)
+        vec[:self.half] = TEXT_WEIGHT * self._normalize(self._encode_text(text))
+        vec[self.half:] = IMAGE_WEIGHT * self._normalize(self._encode_image(image))
+        return self._normalize(vec)
+
+class StandInReranker:
+    """Sustituto del Cross-Encoder: solapamiento de términos (Jaccard) entre query y documento."""
+
+    def predict(self, pairs):
+        scores = []
+        for query, doc in pairs:
+            q, d = set(tokenize(query)), set(tokenize(doc))
+            scores.append(len(q & d) / len(q | d) if q | d else 0.0)
+        return np.asarray(scores, dtype=np.float32)
+
+def build_standin_collection(encoder, name="loadtest_products"):
+    """Colección ChromaDB en memoria con el catálogo real, indexada con el codificador local."""
+    df = pd.read_csv(CSV_PATH)
+    client = chromadb.EphemeralClient()
+    try:
+        client.delete_collection(name=name)
+    except Exception:
+        pass
+    collection = client.create_collection(name=name, metadata={"hnsw:space": "cosine"})
+
+    ids, embeddings, metadatas = [], [], []
+    for _, row in df.iterrows():
+        # El CSV puede traer rutas con separador de Windows
+        relative_path = str(row['image_path']).replace("\\", "/")
+        full_image_path = os.path.join(PROJECT_ROOT, relative_path)
+        if not os.path.exists(full_image_path): continue
+
+        meta = build_product_metadata(row, relative_path)
+        vector = encoder.encode_product(f"{meta['title']} {meta['description']}", Image.open(full_image_path))
+        ids.append(meta["product_id"])
+        embeddings.append(vector.tolist())
+        metadatas.append(meta)
+
+    collection.add(ids=ids, embeddings=embeddings, metadatas=metadatas)
+    return collection
+
+def build_standin_engine():
+    encoder = StandInEncoder()
+    return SearchEngine(
+        embedder=encoder,
+        reranker=StandInReranker(),
+        collection=build_standin_collection(encoder)
+    )
+
+# --- EJECUCIÓN ---
+
+def load_conversations(path=None):
+    if not path:
+        return DEFAULT_CONVERSATIONS
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def run_conversation(engine, conversation, fake_client=None):
+    """Ejecuta una conversación con estado propio (como una sesión de Streamlit)."""
+    mensajes, filtros, turnos = [], {}, []
+    for index, paso in enumerate(conversation):
+        if fake_client:
+            fake_client.set_filtros(paso.get("filtros", {}))
+        imagen_path = os.path.join(TEST_SAMPLES_DIR, paso["imagen"]) if paso.get("imagen") else None
+        inicio = time.perf_counter()
+        turno = procesar_turno(engine, paso["texto"], mensajes, filtros, imagen_path)
+        turnos.append({
+            "turno": index + 1,
+            "tipo": "imagen" if imagen_path else "texto",
+            "latencia": time.perf_counter() - inicio,
+            "tiempos": turno["tiempos"],
+            "resultados": len(turno["resultados"]),
+            "error": turno["error"],
+        })
+    return turnos
+
+def run_load(engine, conversations, concurrency=1, repeat=1, fake_client=None):
+    """Lanza repeat x len(conversations) conversaciones con 'concurrency' sesiones en paralelo."""
+    jobs = [conv for _ in range(repeat) for conv in conversations]
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        resultados = list(pool.map(lambda conv: run_conversation(engine, conv, fake_client), jobs))
+    duracion = time.perf_counter() - inicio
+    return [t for turnos in resultados for t in turnos], duracion
+
+def percentile(values, p):
+    """Percentil por rango más cercano (suficiente para reportes de latencia)."""
+    if not values: return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(np.ceil(p / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+def summarize(values):
+    resumen = {f"p{p}": percentile(values, p) for p in PERCENTILES}
+    resumen["mean"] = float(np.mean(values)) if values else 0.0
+    resumen["max"] = max(values) if values else 0.0
+    resumen["n"] = len(values)
+    return resumen
+
+def build_report(turnos, duracion, concurrency, fake_client):
+    report = {
+        "concurrency": concurrency,
+        "turns": len(turnos),
+        "errors": sum(1 for t in turnos if t["error"]),
+        "duration_s": duracion,
+        "turns_per_s": len(turnos) / duracion if duracion > 0 else 0.0,
+        "latency": {"all": summarize([t["latencia"] for t in turnos])},
+        "stages": {},
+        "llm_calls": fake_client.calls if fake_client else None,
+        "llm_prompt_chars": summarize(fake_client.prompt_chars) if fake_client else None,
+    }
+    for tipo in ("texto", "imagen"):
+        report["latency"][tipo] = summarize([t["latencia"] for t in turnos if t["tipo"] == tipo])
+    for numero in sorted({t["turno"] for t in turnos}):
+        report["latency"][f"turno_{numero}"] = summarize([t["latencia"] for t in turnos if t["turno"] == numero])
+    for etapa in ("filtros", "busqueda", "respuesta"):
+        report["stages"][etapa] = summarize([t["tiempos"][etapa] for t in turnos])
+    return report
+
+def print_report(report):
+    print(f"\nTurnos: {report['turns']} | Errores: {report['errors']} | Concurrencia: {report['concurrency']}")
+    print(f"Duración: {report['duration_s']:.2f}s | Throughput sostenido: {report['turns_per_s']:.2f} turnos/s")
+    header = f"{'':<14}{'n':>6}" + "".join(f"{'p' + str(p):>10}" for p in PERCENTILES) + f"{'max':>10}"
+    for titulo, grupo in (("Latencia por turno (ms)", report["latency"]), ("Latencia por etapa (ms)", report["stages"])):
+        print(f"\n{titulo}\n{header}")
+        for nombre, r in grupo.items():
+            if not r["n"]: continue
+            fila = "".join(f"{r['p' + str(p)] * 1000:>10.1f}" for p in PERCENTILES)
+            print(f"{nombre:<14}{r['n']:>6}{fila}{r['max'] * 1000:>10.1f}")
+    if report["llm_prompt_chars"]:
+        chars = report["llm_prompt_chars"]
+        print(f"\nLlamadas LLM: {report['llm_calls']} | Prompt (caracteres) p50: {chars['p50']} max: {chars['max']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga offline del chat multimodal.")
+    parser.add_argument("--conversations", help="JSON con lista de conversaciones [[{texto, imagen?, filtros?}, ...], ...]")
+    parser.add_argument("--concurrency", type=int, default=1, help="Sesiones simultáneas")
+    parser.add_argument("--repeat", type=int, default=3, help="Veces que se reproduce cada conversación")
+    parser.add_argument("--warmup", type=int, default=1, help="Conversaciones de calentamiento (no se miden)")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Latencia simulada del LLM (s)")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="Variación máxima ± de la latencia (s)")
+    parser.add_argument("--real-models", action="store_true", help="Usar CLIP/Cross-Encoder y ChromaDB reales")
+    parser.add_argument("--json", help="Guardar el reporte en este archivo")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar los logs del motor")
+    args = parser.parse_args()
+
+    conversations = load_conversations(args.conversations)
+    fake_client = FakeGenAIClient(latency=args.llm_latency, jitter=args.llm_jitter)
+    ai_logic.configurar_cliente(fake_client)
+
+    print("Preparando motor de búsqueda...")
+    engine = SearchEngine() if args.real_models else build_standin_engine()
+
+    # Los print() del motor por cada búsqueda distorsionan la medición con muchas sesiones
+    with open(os.devnull, "w") as devnull:
+        logs = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+        with logs:
+            for conv in conversations[:args.warmup]:
+                run_conversation(engine, conv, fake_client)
+            fake_client.calls, fake_client.prompt_chars = 0, []
+            turnos, duracion = run_load(engine, conversations, args.concurrency, args.repeat, fake_client)
+
+    report = build_report(turnos, duracion, args.concurrency, fake_client)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReporte guardado en: {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ from sentence_transformers import SentenceTransformer
 from PIL import Image
 import os
 import torch
+from src.snippets import snippet_from_rag_context
+from src.lexical_index import LexicalIndex
 
 # --- CONFIGURACIÓN DE RUTAS ---
 # Ubicación de este script (src/processing.py)
@@ -14,6 +16,8 @@ PROJECT_ROOT = os.path.dirname(BASE_DIR)
 
 CSV_PATH = os.path.join(PROJECT_ROOT, "data", "processed_products.csv")
 DB_PATH = os.path.join(PROJECT_ROOT, "data", "chroma_db")
+# Índice léxico BM25 (complementa a CLIP en marcas, modelos y SKUs)
+LEXICAL_INDEX_PATH = os.path.join(PROJECT_ROOT, "data", "lexical_index.json.gz")
 
 # Nombre de la colección en ChromaDB
 COLLECTION_NAME = "amazon_products"
@@ -22,6 +26,28 @@ COLLECTION_NAME = "amazon_products"
 # Usamos uno ligero y eficiente para CPU: CLIP ViT-B-32
 MODEL_NAME = "clip-ViT-B-32"
 
+def build_product_metadata(row, relative_path):
+    """Metadatos que se guardan en ChromaDB por producto (también los usa src.loadtest)."""
+    # Snippet compacto para el prompt RAG (CSVs antiguos no traen la columna)
+    if 'rag_snippet' in row.index and pd.notna(row['rag_snippet']):
+        rag_snippet, rag_tokens = str(row['rag_snippet']), int(row['rag_tokens'])
+    else:
+        rag_snippet, rag_tokens = snippet_from_rag_context(
+            row['title'], row['brand'], row['category'], row['rag_context']
+        )
+
+    return {
+        "product_id": str(row['id']),
+        "title": str(row['title']),
+        "category": str(row['category']),
+        "brand": str(row['brand']),
+        "description": str(row['description']),
+        "rag_context": str(row['rag_context']),
+        "rag_snippet": rag_snippet,
+        "rag_tokens": rag_tokens,
+        "image_relative_path": relative_path # Guardamos ruta relativa para la UI
+    }
+
 def process_and_index():
     print(f"Iniciando proceso de indexación...")
     
@@ -64,6 +90,7 @@ def process_and_index():
     ids = []
     embeddings = []
     metadatas = []
+    lexical_docs = []
     
     successful_count = 0
     
@@ -88,19 +115,12 @@ def process_and_index():
             vector = model.encode(image).tolist()
             
             # Preparar metadatos para recuperarlos luego en la UI
-            meta = {
-                "product_id": str(row['id']),
-                "title": str(row['title']),
-                "category": str(row['category']),
-                "brand": str(row['brand']),
-                "description": str(row['description']),
-                "rag_context": str(row['rag_context']),
-                "image_relative_path": relative_path # Guardamos ruta relativa para la UI
-            }
+            meta = build_product_metadata(row, relative_path)
             
             ids.append(str(row['id']))
             embeddings.append(vector)
             metadatas.append(meta)
+            lexical_docs.append((meta["product_id"], f"{meta['title']} {meta['brand']} {meta['description']}"))
             
             successful_count += 1
             
@@ -123,6 +143,12 @@ def process_and_index():
         )
         print("¡Indexación completada con éxito!")
         print(f"   Total indexado: {collection.count()} documentos.")
+
+        # 6. Índice léxico con los mismos productos que quedaron en ChromaDB
+        print(f"Construyendo índice léxico BM25 en: {LEXICAL_INDEX_PATH}")
+        lexical_index = LexicalIndex.build(lexical_docs)
+        lexical_index.save(LEXICAL_INDEX_PATH)
+        print(f"   Términos indexados: {len(lexical_index.postings)}")
     else:
         print("No se generaron embeddings válidos.")
 
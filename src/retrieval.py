@@ -3,21 +3,46 @@ from sentence_transformers import SentenceTransformer, CrossEncoder
 from PIL import Image
 import os
 import torch
+import numpy as np
+from src.lexical_index import LexicalIndex, tokenize
 
 # --- CONFIGURACIÓN ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(BASE_DIR)
 DB_PATH = os.path.join(PROJECT_ROOT, "data", "chroma_db")
+LEXICAL_INDEX_PATH = os.path.join(PROJECT_ROOT, "data", "lexical_index.json.gz")
 
 # Modelos
 EMBEDDING_MODEL = "clip-ViT-B-32"
 # Modelo Cross-Encoder para el Re-ranking (más lento pero más preciso)
 RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
 
+# Fusión híbrida (Reciprocal Rank Fusion). 60 es el valor habitual en la literatura.
+RRF_K = 60
+# Consultas de hasta N términos con algún dígito ("Fire HD 8", "AAA 36") se tratan como
+# identificadores: si algún producto contiene todos sus términos, se resuelven solo con BM25.
+IDENTIFIER_MAX_TERMS = 4
+
+def identifier_terms(query):
+    """Términos con dígitos ("4k", "48", "b00zv9rdkk"): deben aparecer literalmente en el producto."""
+    return [t for t in tokenize(query) if any(c.isdigit() for c in t)]
+
+def is_identifier_query(query):
+    return 0 < len(tokenize(query)) <= IDENTIFIER_MAX_TERMS and bool(identifier_terms(query))
+
+def reciprocal_rank_fusion(*ranked_id_lists, k=RRF_K):
+    """Combina listas ordenadas de IDs. Retorna [(id, score_rrf)] de mayor a menor."""
+    scores = {}
+    for ranked_ids in ranked_id_lists:
+        for rank, doc_id in enumerate(ranked_ids):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
 class SearchEngine:
-    def __init__(self):
+    def __init__(self, embedder=None, reranker=None, collection=None):
         """
         Carga los modelos y conecta a la BD una sola vez al iniciar la app.
+        Se pueden inyectar embedder/reranker/colección (ej. sustitutos locales en src.loadtest).
         """
         print("Inicializando Motor de Búsqueda...")
         
@@ -26,45 +51,36 @@ class SearchEngine:
         print(f"   -> Usando dispositivo: {self.device}")
 
         # 2. Cargar CLIP (para búsqueda rápida inicial)
-        print("   -> Cargando modelo de Embeddings (CLIP)...")
-        self.embedder = SentenceTransformer(EMBEDDING_MODEL, device=self.device)
+        if embedder is None:
+            print("   -> Cargando modelo de Embeddings (CLIP)...")
+            embedder = SentenceTransformer(EMBEDDING_MODEL, device=self.device)
+        self.embedder = embedder
 
         # 3. Cargar Cross-Encoder (para re-ranking)
-        print("   -> Cargando modelo de Re-ranking...")
-        self.reranker = CrossEncoder(RERANKER_MODEL, device=self.device)
+        if reranker is None:
+            print("   -> Cargando modelo de Re-ranking...")
+            reranker = CrossEncoder(RERANKER_MODEL, device=self.device)
+        self.reranker = reranker
 
         # 4. Conectar a ChromaDB
-        print(f"   -> Conectando a Base de Datos en: {DB_PATH}")
-        self.client = chromadb.PersistentClient(path=DB_PATH)
-        self.collection = self.client.get_collection("amazon_products")
-        
-        print("Motor listo.")
+        if collection is None:
+            print(f"   -> Conectando a Base de Datos en: {DB_PATH}")
+            self.client = chromadb.PersistentClient(path=DB_PATH)
+            collection = self.client.get_collection("amazon_products")
+        self.collection = collection
 
-    def search(self, query, top_k_retrieval=20, top_k_final=5):
-        """
-        Realiza la búsqueda híbrida:
-        1. Retrieval: Busca los 20 más parecidos con CLIP.
-        2. Re-ranking: Ordena esos 20 usando el Cross-Encoder.
-        """
-        
-        # --- PASO 1: RETRIEVAL (Búsqueda Vectorial) ---
-        # Determinar si la query es texto o ruta de imagen
-        is_image_query = False
-        
-        if os.path.exists(query) and query.lower().endswith(('.jpg', '.png', '.jpeg')):
-            # Es una búsqueda IMAGEN-A-PRODUCTO
-            print(f"Buscando por imagen: {query}")
-            is_image_query = True
-            image = Image.open(query)
-            query_emb = self.embedder.encode(image).tolist()
-            query_content = "Image Query" # Placeholder para el reranker visual si fuera necesario
+        # 5. Índice léxico BM25 (opcional: si no existe, búsqueda solo vectorial)
+        self.lexical_index = None
+        if os.path.exists(LEXICAL_INDEX_PATH):
+            print(f"   -> Cargando índice léxico: {LEXICAL_INDEX_PATH}")
+            self.lexical_index = LexicalIndex.load(LEXICAL_INDEX_PATH)
         else:
-            # Es una búsqueda TEXTO-A-PRODUCTO
-            print(f"Buscando por texto: '{query}'")
-            query_emb = self.embedder.encode(query).tolist()
-            query_content = query
+            print("   -> Sin índice léxico (ejecuta src.processing). Solo búsqueda vectorial.")
+        
+        print("Motor listo.")
 
-        # Consulta a ChromaDB
+    def _vector_candidates(self, query_emb, top_k_retrieval):
+        """Consulta a ChromaDB y formatea los resultados (score = similitud coseno CLIP)."""
         results = self.collection.query(
             query_embeddings=[query_emb],
             n_results=top_k_retrieval,
@@ -72,7 +88,6 @@ class SearchEngine:
             include=['metadatas', 'distances'] 
         )
 
-        # Formatear resultados iniciales
         candidates = []
         ids = results['ids'][0]
         metas = results['metadatas'][0]
@@ -85,13 +100,119 @@ class SearchEngine:
                 "metadata": metas[i],
                 "original_rank": i + 1
             })
+        return candidates
+
+    def _lexical_candidates(self, lexical_hits):
+        """
+        Candidatos solo léxicos (sin CLIP): los hits ya filtrados por _exact_lexical_hits.
+        score = BM25 normalizado respecto al mejor, que NO es comparable con la similitud CLIP;
+        por eso se marcan con retrieval='lexical' y no se les aplican los umbrales de src.conversation.
+        """
+        top_bm25 = lexical_hits[0][1]
+        found = self.collection.get(ids=[doc_id for doc_id, _ in lexical_hits], include=['metadatas'])
+        meta_by_id = dict(zip(found['ids'], found['metadatas']))
+
+        candidates = []
+        for doc_id, bm25 in lexical_hits:
+            if doc_id not in meta_by_id: continue
+            candidates.append({
+                "id": doc_id,
+                "score": bm25 / top_bm25,
+                "lexical_score": bm25,
+                "retrieval": "lexical",
+                "metadata": meta_by_id[doc_id],
+                "original_rank": len(candidates) + 1
+            })
+        return candidates
+
+    def _fuse_candidates(self, vector_candidates, lexical_hits, query_emb, top_k_retrieval):
+        """
+        Fusiona CLIP y BM25 con RRF y corta a top_k_retrieval,
+        así el Cross-Encoder sigue evaluando el mismo número de pares.
+        """
+        by_id = {c['id']: c for c in vector_candidates}
+        lexical_scores = dict(lexical_hits)
+        fused = reciprocal_rank_fusion(
+            [c['id'] for c in vector_candidates],
+            [doc_id for doc_id, _ in lexical_hits]
+        )[:top_k_retrieval]
+
+        # Los que solo trajo BM25: recuperamos su embedding para que 'score' siga siendo similitud CLIP
+        missing = [doc_id for doc_id, _ in fused if doc_id not in by_id]
+        if missing:
+            found = self.collection.get(ids=missing, include=['metadatas', 'embeddings'])
+            query_vec = np.asarray(query_emb, dtype=np.float32)
+            query_vec = query_vec / np.linalg.norm(query_vec)
+            for doc_id, meta, emb in zip(found['ids'], found['metadatas'], found['embeddings']):
+                emb = np.asarray(emb, dtype=np.float32)
+                by_id[doc_id] = {
+                    "id": doc_id,
+                    "score": float(query_vec @ emb / np.linalg.norm(emb)),
+                    "metadata": meta
+                }
+
+        candidates = []
+        for doc_id, rrf_score in fused:
+            if doc_id not in by_id: continue
+            cand = by_id[doc_id]
+            cand['rrf_score'] = rrf_score
+            if doc_id in lexical_scores:
+                cand['lexical_score'] = lexical_scores[doc_id]
+            cand['original_rank'] = len(candidates) + 1
+            candidates.append(cand)
+        return candidates
+
+    def _exact_lexical_hits(self, query, lexical_hits):
+        """
+        Hits BM25 que contienen TODOS los términos de la consulta (BM25 no lo exige).
+        Solo para consultas cortas tipo identificador; si ninguno coincide se usa la fusión CLIP+BM25.
+        """
+        if not lexical_hits or not is_identifier_query(query): return []
+        terms = tokenize(query)
+        return [(doc_id, bm25) for doc_id, bm25 in lexical_hits
+                if self.lexical_index.contains_all(doc_id, terms)]
+
+    def search(self, query, top_k_retrieval=20, top_k_final=5):
+        """
+        Realiza la búsqueda híbrida:
+        1. Retrieval: Busca los 20 más parecidos con CLIP y con BM25, fusionados con RRF.
+           Las consultas tipo identificador ("Fire HD 8") con coincidencia exacta se resuelven solo con BM25.
+        2. Re-ranking: Ordena esos 20 usando el Cross-Encoder.
+        """
+        
+        # --- PASO 1: RETRIEVAL (Léxico + Vectorial) ---
+        # Determinar si la query es texto o ruta de imagen
+        is_image_query = False
+        
+        if os.path.exists(query) and query.lower().endswith(('.jpg', '.png', '.jpeg')):
+            # Es una búsqueda IMAGEN-A-PRODUCTO
+            print(f"Buscando por imagen: {query}")
+            is_image_query = True
+            image = Image.open(query)
+            query_emb = self.embedder.encode(image).tolist()
+            candidates = self._vector_candidates(query_emb, top_k_retrieval)
+        else:
+            # Es una búsqueda TEXTO-A-PRODUCTO
+            lexical_hits = self.lexical_index.search(query, top_k_retrieval) if self.lexical_index else []
+
+            exact_hits = self._exact_lexical_hits(query, lexical_hits)
+            candidates = self._lexical_candidates(exact_hits) if exact_hits else []
+
+            if candidates:
+                print(f"Buscando por identificador (solo léxico): '{query}'")
+            else:
+                print(f"Buscando por texto: '{query}'")
+                query_emb = self.embedder.encode(query).tolist()
+                candidates = self._vector_candidates(query_emb, top_k_retrieval)
+                if lexical_hits:
+                    candidates = self._fuse_candidates(candidates, lexical_hits, query_emb, top_k_retrieval)
 
         # --- PASO 2: RE-RANKING ---
         # El Cross-Encoder compara (Query, Documento) y da un score de relevancia real.
         # NOTA: Cross-Encoder funciona mejor Texto-Texto. 
         # Si la búsqueda es por IMAGEN, saltamos el re-ranking textual o usamos solo scores de CLIP.
         
-        if not is_image_query:
+        if not is_image_query and candidates:
             print("   -> Aplicando Re-ranking...")
             # Preparamos pares [Query, Texto del Producto]
             # Usamos la descripción completa del producto para comparar
@@ -0,0 +1,68 @@
+import re
+
+# --- CONFIGURACIÓN ---
+# Aproximación estándar para modelos tipo Gemini/Gemma: ~4 caracteres por token
+CHARS_PER_TOKEN = 4
+
+# Cuántas reseñas citar en el snippet y hasta cuántos caracteres cada una
+MAX_SNIPPET_REVIEWS = 2
+MAX_REVIEW_CHARS = 120
+
+# Formato de las reseñas generado por el ETL: "[5/5] Texto de la reseña"
+REVIEW_PATTERN = re.compile(r"^\[(?P<rating>[^\]/]*)/5\]\s*(?P<text>.*)$")
+REVIEW_SEPARATOR = " || "
+
+def estimate_tokens(text):
+    """Cuenta aproximada de tokens (sin tokenizer real, suficiente para presupuestar)."""
+    if not text: return 0
+    return max(1, -(-len(str(text)) // CHARS_PER_TOKEN))
+
+def truncate_words(text, max_chars):
+    """Recorta en el último espacio antes de max_chars para no cortar palabras."""
+    text = str(text).strip()
+    if len(text) <= max_chars: return text
+    cut = text[:max_chars].rsplit(' ', 1)[0]
+    return cut.rstrip(' .,;:') + "..."
+
+def parse_review(review):
+    """Devuelve (rating, texto) de una reseña formateada por el ETL."""
+    match = REVIEW_PATTERN.match(str(review).strip())
+    if not match: return None, str(review).strip()
+    try:
+        rating = float(match.group('rating'))
+    except ValueError:
+        rating = None
+    return rating, match.group('text').strip()
+
+def build_rag_snippet(title, brand, category, reviews):
+    """
+    Construye la evidencia compacta de un producto para el prompt RAG:
+    título, marca, categoría, media de la muestra de reseñas y extractos cortos de las primeras.
+    Retorna (snippet, tokens_aproximados).
+    """
+    parts = [str(title).strip() or "Producto"]
+    if brand: parts.append(f"Brand: {brand}")
+    if category: parts.append(f"Category: {category}")
+
+    parsed = [parse_review(r) for r in reviews if str(r).strip()]
+    ratings = [r for r, _ in parsed if r is not None]
+    if ratings:
+        # Es una muestra de las reseñas del ETL, no el rating real del producto
+        parts.append(f"Sample reviews: {len(ratings)}, avg {sum(ratings) / len(ratings):.1f}/5")
+
+    excerpts = [truncate_words(t, MAX_REVIEW_CHARS) for _, t in parsed if t]
+    if excerpts:
+        parts.append("Reviews: " + " / ".join(f'"{e}"' for e in excerpts[:MAX_SNIPPET_REVIEWS]))
+
+    snippet = " | ".join(parts)
+    return snippet, estimate_tokens(snippet)
+
+def snippet_from_rag_context(title, brand, category, rag_context):
+    """
+    Deriva el snippet a partir del 'rag_context' largo (CSVs o índices generados
+    antes de que el ETL precalculara 'rag_snippet').
+    """
+    reviews = []
+    if rag_context and "Reviews Summary:" in str(rag_context):
+        reviews = str(rag_context).split("Reviews Summary:", 1)[1].split(REVIEW_SEPARATOR)
+    return build_rag_snippet(title, brand, category, reviews)